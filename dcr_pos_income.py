@@ -18,14 +18,45 @@
 #
 
 import argparse
+import base64
+import concurrent.futures
+import configparser
 import csv
 from datetime import datetime, timezone
+import functools
+import http.client
 import json
 import logging
+import sqlite3
+import ssl
 import subprocess
-import tempfile
 import sys
 import os
+import threading
+import time
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# use orjson for parsing and serializing JSON when it is available
+def json_loads(s):
+    if orjson != None:
+        return orjson.loads(s)
+
+    return json.loads(s)
+
+def json_dumps(obj):
+    if orjson != None:
+        return orjson.dumps(obj).decode()
+
+    return json.dumps(obj)
 
 default_format_mode = 'verbose'
 default_csv_prices_file = 'dcr_prices.csv'
@@ -34,92 +65,316 @@ default_first_date = '1900-01-01'
 default_last_date = '9999-12-31'
 default_cache_file = 'dcrctl.cache'
 
+def app_data_dir(app_name):
+    if sys.platform == 'win32':
+        return os.path.join(os.environ.get('LOCALAPPDATA', ''), app_name.capitalize())
+    elif sys.platform == 'darwin':
+        return os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', app_name.capitalize())
+
+    return os.path.join(os.path.expanduser('~'), '.' + app_name.lower())
+
+default_dcrctl_conf = os.path.join(app_data_dir('dcrctl'), 'dcrctl.conf')
+default_dcrd_conf = os.path.join(app_data_dir('dcrd'), 'dcrd.conf')
+default_rpc_cert = os.path.join(app_data_dir('dcrd'), 'rpc.cert')
+
+def load_rpc_config(filename, server_option='rpcserver'):
+    # dcrctl.conf and dcrd.conf are ini files, but the section header is
+    # optional
+    parser = configparser.ConfigParser(strict=False, interpolation=None, allow_no_value=True)
+
+    # anything we can't make sense of means falling back to dcrctl,
+    # which reads the file itself
+    try:
+        with open(filename, mode='r') as f:
+            parser.read_string('[Application Options]\n' + f.read())
+    except (OSError, UnicodeDecodeError, configparser.Error):
+        return None
+
+    opts = parser['Application Options']
+
+    if not opts.get('rpcuser') or not opts.get('rpcpass'):
+        return None
+
+    def flag(name):
+        # like go-flags, a boolean option given without a value is set
+        if name in opts and opts[name] == None:
+            return True
+
+        return opts.getboolean(name, False)
+
+    try:
+        simnet = flag('simnet')
+        testnet = flag('testnet')
+        notls = flag('notls')
+    except ValueError:
+        return None
+
+    if simnet:
+        default_port = 19556
+    elif testnet:
+        default_port = 19109
+    else:
+        default_port = 9109
+
+    server = opts.get(server_option) or 'localhost'
+    host, sep, port = server.rpartition(':')
+    if not sep or not port.isdigit() or (':' in host and not host.startswith('[')):
+        host = server
+        port = default_port
+
+    host = host.strip('[]')
+
+    # a wildcard address means the server is local (dcrd may listen on
+    # all interfaces)
+    if host == '' or host == '0.0.0.0' or host == '::':
+        host = 'localhost'
+
+    return {
+        'host': host,
+        'port': int(port),
+        'user': opts['rpcuser'],
+        'password': opts['rpcpass'],
+        'cert': os.path.expanduser(opts.get('rpccert') or default_rpc_cert),
+        'notls': notls,
+    }
+
 class dcrctl_cli:
-    cache_version = 1
+    cache_version = 2
     unflushed_cache_cnt = 0
     max_unflushed = 10
+    batch_size = 20
+    # dcrd accepts at most 10 RPC clients by default
+    max_workers = 8
 
     def exec_cmd(self, cmd_args):
-        r = self.get_cache(cmd_args)
-        if r != None:
-            return r
+        return self.exec_cmds([cmd_args])[0]
 
-        cmd = ['dcrctl'] + cmd_args
+    def exec_cmds(self, cmds):
+        results = [self.get_cache(cmd_args) for cmd_args in cmds]
 
-        r = subprocess.run(cmd, check=True, universal_newlines=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # send each distinct uncached command only once, no matter how
+        # many times it was asked for
+        pending = {}
+        for i, r in enumerate(results):
+            if r == None:
+                pending.setdefault(self.cache_key(cmds[i]), []).append(i)
+
+        pending = list(pending.values())
+        batches = [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+
+        # batches run concurrently, but the cache is only updated from
+        # this thread
+        replies = self.executor.map(self.run_batch, [[cmds[idxs[0]] for idxs in batch] for batch in batches])
+
+        for batch, batch_results in zip(batches, replies):
+            for idxs, r in zip(batch, batch_results):
+                self.add_cache(cmds[idxs[0]], r)
+                for i in idxs:
+                    results[i] = r
 
-        self.add_cache(cmd_args, r.stdout)
+        return results
+
+    def run_batch(self, cmds):
+        if self.rpc_config == None:
+            return [self.run_dcrctl(cmd_args) for cmd_args in cmds]
+
+        return self.run_rpc(cmds)
+
+    def run_dcrctl(self, cmd_args):
+        cmd = ['dcrctl'] + [str(a) for a in cmd_args]
+
+        r = subprocess.run(cmd, check=True, universal_newlines=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
         return r.stdout
 
+    # send all commands to dcrd as a single JSON-RPC batch request
+    def run_rpc(self, cmds):
+        body = json_dumps([{ 'jsonrpc': '1.0', 'id': i, 'method': cmd_args[0], 'params': cmd_args[1:] }
+            for i, cmd_args in enumerate(cmds)])
+
+        reply = json_loads(self.rpc_post(body))
+
+        # dcrd answers with a single error object when it rejects the
+        # whole batch
+        if not isinstance(reply, list):
+            error = reply.get('error') if isinstance(reply, dict) else reply
+            raise RuntimeError('dcrd RPC batch failed: {}'.format(error))
+
+        replies = {}
+        for r in reply:
+            replies[r['id']] = r
+
+        results = []
+        for i, cmd_args in enumerate(cmds):
+            if i not in replies or replies[i].get('error') != None:
+                error = replies[i].get('error') if i in replies else 'no reply'
+                raise RuntimeError('dcrd RPC {} failed: {}'.format(' '.join(str(a) for a in cmd_args), error))
+
+            r = replies[i]['result']
+
+            # store results the way dcrctl would print them
+            results.append(r if isinstance(r, str) else json_dumps(r))
+
+        return results
+
+    def rpc_post(self, body):
+        headers = {
+            'Authorization': 'Basic ' + self.rpc_auth,
+            'Content-Type': 'application/json',
+        }
+
+        # each worker thread reuses its own connection across requests,
+        # reconnecting once if dcrd closed it in the meantime
+        for attempt in range(2):
+            conn = getattr(self.rpc_local, 'conn', None)
+            if conn == None:
+                conn = self.rpc_connect()
+                self.rpc_local.conn = conn
+
+            try:
+                conn.request('POST', '/', body, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self.rpc_local.conn = None
+                if attempt != 0:
+                    raise
+
+        if resp.status != 200:
+            raise RuntimeError('dcrd RPC request failed: {} {}'.format(resp.status, resp.reason))
+
+        return data
+
+    def rpc_connect(self):
+        host = self.rpc_config['host']
+        port = self.rpc_config['port']
+
+        if self.rpc_config['notls']:
+            conn = http.client.HTTPConnection(host, port)
+        else:
+            context = ssl.create_default_context(cafile=self.rpc_config['cert'])
+            conn = http.client.HTTPSConnection(host, port, context=context)
+
+        with self.rpc_conns_lock:
+            self.rpc_conns.append(conn)
+
+        return conn
+
     # these functions interact with dcrctl
     def getrawtransaction(self, txid):
-        r = self.exec_cmd(['getrawtransaction', txid])
+        return self.getrawtransactions([txid])[0]
 
-        return r.strip()
+    def getrawtransactions(self, txids):
+        r = self.exec_cmds([['getrawtransaction', txid] for txid in txids])
+
+        return [raw_tx.strip() for raw_tx in r]
 
     def decoderawtransaction(self, raw_tx):
-        r = self.exec_cmd(['decoderawtransaction', raw_tx])
-        tx_contents = json.loads(r)
+        return self.decoderawtransactions([raw_tx])[0]
+
+    def decoderawtransactions(self, raw_txs):
+        r = self.exec_cmds([['decoderawtransaction', raw_tx] for raw_tx in raw_txs])
 
-        return tx_contents
+        return [json_loads(tx_contents) for tx_contents in r]
 
     def getblockhash(self, block_num):
-        r = self.exec_cmd(['getblockhash', str(block_num)])
+        return self.getblockhashes([block_num])[0]
 
-        return r.strip()
+    def getblockhashes(self, block_nums):
+        r = self.exec_cmds([['getblockhash', int(block_num)] for block_num in block_nums])
+
+        return [block_hash.strip() for block_hash in r]
 
     def getblockheader(self, block_hash):
-        r = self.exec_cmd(['getblockheader', block_hash])
-        header = json.loads(r)
+        return self.getblockheaders([block_hash])[0]
+
+    def getblockheaders(self, block_hashes):
+        r = self.exec_cmds([['getblockheader', block_hash] for block_hash in block_hashes])
 
-        return header
+        return [json_loads(header) for header in r]
 
     # helper functions that combine above operations
     def get_decoded_tx(self, txid):
-        raw_tx = self.getrawtransaction(txid)
-        tx_contents = self.decoderawtransaction(raw_tx)
+        return self.get_decoded_txs([txid])[0]
+
+    def get_decoded_txs(self, txids):
+        # verbose getrawtransaction returns the decoded transaction
+        # directly, saving a decoderawtransaction per tx
+        r = self.exec_cmds([['getrawtransaction', txid, 1] for txid in txids])
 
-        return tx_contents
+        return [json_loads(tx_contents) for tx_contents in r]
 
     def get_block_time(self, block_num):
-        block_hash = self.getblockhash(block_num)
-        header = self.getblockheader(block_hash)
+        return self.get_block_times([block_num])[0]
+
+    def get_block_times(self, block_nums):
+        # many tickets are bought in the same blocks, so remember block
+        # times for the rest of the run
+        missing = [n for n in dict.fromkeys(block_nums) if n not in self.block_times]
+
+        if missing:
+            block_hashes = self.getblockhashes(missing)
+            headers = self.getblockheaders(block_hashes)
 
-        return header['time']
+            for n, header in zip(missing, headers):
+                self.block_times[n] = header['time']
+
+        return [self.block_times[n] for n in block_nums]
 
     # cache related utilities
     def load_cache(self):
         if self.no_cache:
             return
 
-        try:
-            with open(self.cache_filename, mode='r') as json_file:
-                self.cache = json.load(json_file)
-        except FileNotFoundError as e:
+        cache_exists = os.path.exists(self.cache_filename)
+        if not cache_exists:
             print('info: {} not found, using empty cache'.format(self.cache_filename), file=sys.stderr)
-            self.cache = { 'cache_version': self.cache_version }
 
-        if self.cache['cache_version'] != self.cache_version:
-            print('info: unexpected cache version {} (expected {}), replacing'.format(self.cache['cache_version'], self.cache_version), file=sys.stderr)
-            self.cache = { 'cache_version': self.cache_version }
+        self.cache_db = sqlite3.connect(self.cache_filename)
+
+        try:
+            version = self.cache_db.execute('PRAGMA user_version').fetchone()[0]
+        except sqlite3.DatabaseError:
+            # most likely a cache file from before caches were sqlite
+            print('info: {} is not a cache database, replacing'.format(self.cache_filename), file=sys.stderr)
+            self.cache_db.close()
+            os.remove(self.cache_filename)
+            self.cache_db = sqlite3.connect(self.cache_filename)
+            version = self.cache_version
+
+        if cache_exists and version != self.cache_version:
+            print('info: unexpected cache version {} (expected {}), replacing'.format(version, self.cache_version), file=sys.stderr)
+            self.cache_db.execute('DROP TABLE IF EXISTS cache')
+
+        self.cache_db.execute('PRAGMA journal_mode=WAL')
+        self.cache_db.execute('PRAGMA synchronous=NORMAL')
+        self.cache_db.execute('''CREATE TABLE IF NOT EXISTS cache (
+            cmd_type TEXT NOT NULL,
+            cmd_arg1 TEXT NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY (cmd_type, cmd_arg1)) WITHOUT ROWID''')
+        self.cache_db.execute('PRAGMA user_version = {}'.format(self.cache_version))
+        self.cache_db.commit()
 
     def save_cache(self):
         if self.no_cache:
             return
 
-        cache_file_dir = os.path.dirname(self.cache_filename)
-        temp_out = tempfile.NamedTemporaryFile(mode='w+', delete=False, dir=cache_file_dir)
-        json.dump(self.cache, temp_out)
-        os.rename(temp_out.name, self.cache_filename)
+        self.cache_db.commit()
 
     def cachable(self, cmd_args):
-        # currently we only cache command output for 2 arg commands
-        if len(cmd_args) == 2:
+        # currently we only cache command output for 2 and 3 arg commands
+        if len(cmd_args) == 2 or len(cmd_args) == 3:
             return True
 
         return False
 
+    def cache_key(self, cmd_args):
+        # any extra argument (e.g. verbose) becomes part of cmd_arg1
+        return str(cmd_args[0]), ' '.join(str(a) for a in cmd_args[1:])
+
     def get_cache(self, cmd_args):
         if self.no_cache:
             return None
@@ -127,16 +382,20 @@ class dcrctl_cli:
         if not self.cachable(cmd_args):
             return None
 
-        cmd_type = str(cmd_args[0])
-        cmd_arg1 = str(cmd_args[1])
-
-        if cmd_type not in self.cache:
+        try:
+            return self.lookup_cache(*self.cache_key(cmd_args))
+        except KeyError:
             return None
 
-        if cmd_arg1 in self.cache[cmd_type]:
-            return self.cache[cmd_type][cmd_arg1]
+    def lookup_cache(self, cmd_type, cmd_arg1):
+        r = self.cache_db.execute('SELECT result FROM cache WHERE cmd_type = ? AND cmd_arg1 = ?',
+            (cmd_type, cmd_arg1)).fetchone()
 
-        return None
+        # raise rather than return None, so misses are not memoized
+        if r == None:
+            raise KeyError((cmd_type, cmd_arg1))
+
+        return r[0]
 
     def add_cache(self, cmd_args, result):
         if self.no_cache:
@@ -145,17 +404,14 @@ class dcrctl_cli:
         if not self.cachable(cmd_args):
             return
 
-        # already cached
-        if self.get_cache(cmd_args) != None:
-            return
-
-        cmd_type = str(cmd_args[0])
-        cmd_arg1 = str(cmd_args[1])
+        cmd_type, cmd_arg1 = self.cache_key(cmd_args)
 
-        if cmd_type not in self.cache:
-            self.cache[cmd_type] = {}
+        c = self.cache_db.execute('INSERT OR IGNORE INTO cache (cmd_type, cmd_arg1, result) VALUES (?, ?, ?)',
+            (cmd_type, cmd_arg1, result))
 
-        self.cache[cmd_type][cmd_arg1] = result
+        # already cached
+        if c.rowcount == 0:
+            return
 
         self.unflushed_cache_cnt += 1
         if self.unflushed_cache_cnt >= self.max_unflushed:
@@ -167,10 +423,32 @@ class dcrctl_cli:
             self.save_cache()
             self.unflushed_cache_cnt = 0
 
-    def __init__(self, no_cache=False, cache_filename='dcrctl.cache', max_unflushed=10):
+        if not self.no_cache:
+            self.cache_db.close()
+
+        self.executor.shutdown()
+
+        for conn in self.rpc_conns:
+            conn.close()
+        self.rpc_conns = []
+
+    def __init__(self, no_cache=False, cache_filename='dcrctl.cache', max_unflushed=10, rpc_config=None):
         self.cache_filename = cache_filename
         self.max_unflushed = max_unflushed
         self.no_cache = no_cache
+        self.block_times = {}
+        self.rpc_config = rpc_config
+        self.rpc_local = threading.local()
+        self.rpc_conns = []
+        self.rpc_conns_lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        # keep recently used cache entries in memory in front of sqlite
+        self.lookup_cache = functools.lru_cache(maxsize=65536)(self.lookup_cache)
+
+        if rpc_config != None:
+            creds = '{}:{}'.format(rpc_config['user'], rpc_config['password'])
+            self.rpc_auth = base64.b64encode(creds.encode()).decode()
 
         self.load_cache()
 
@@ -188,17 +466,32 @@ def load_prices(filename):
 
     return db
 
-def get_days_price(db, date):
-    utc_date = date.astimezone(timezone.utc)
-    utc_date_str = utc_date.strftime('%Y-%m-%d')
+# formatting dates is slow, and many timestamps fall on the same day
+@functools.lru_cache(maxsize=4096)
+def day_str(day_ordinal):
+    return datetime.fromtimestamp(day_ordinal * 86400, timezone.utc).strftime('%Y-%m-%d')
 
-    if utc_date_str in db:
-        return db[utc_date_str]
+def format_utc_date(utc_tstamp):
+    return day_str(utc_tstamp // 86400)
 
-    raise RuntimeError('Could not find date {} in price database!'.format(utc_date_str))
+def format_local_date(utc_tstamp):
+    # the offset has to be looked up per timestamp to follow DST, but
+    # localtime() is much cheaper than building an aware datetime
+    offset = time.localtime(utc_tstamp).tm_gmtoff
+
+    return day_str((utc_tstamp + offset) // 86400)
+
+def get_days_price(db, utc_tstamp):
+    utc_date_str = format_utc_date(utc_tstamp)
+
+    try:
+        return db[utc_date_str]
+    except KeyError:
+        raise RuntimeError('Could not find date {} in price database!'.format(utc_date_str)) from None
 
 def main():
     logging.basicConfig(level=logging.ERROR)
+    debug_on = logging.getLogger().isEnabledFor(logging.DEBUG)
 
     parser = argparse.ArgumentParser(description='Calculate Decred PoS Income Details')
 
@@ -216,6 +509,8 @@ def main():
         action='store_true', help='disable dcrctl output caching')
     parser.add_argument('--cache_file', dest='cache_file', default=default_cache_file,
         help='select dcrctl cache file (default: {})'.format(default_cache_file))
+    parser.add_argument('--dcrctl_conf', default=default_dcrctl_conf,
+        help='dcrctl config file with dcrd RPC settings (default: {})'.format(default_dcrctl_conf))
 
     args = parser.parse_args()
 
@@ -226,6 +521,10 @@ def main():
     first_date = datetime.strptime(args.first_date, '%Y-%m-%d').astimezone()
     last_date = datetime.strptime(args.last_date, '%Y-%m-%d').astimezone()
 
+    # compare against the raw blocktimes rather than building datetimes
+    first_ts = int(first_date.timestamp())
+    last_ts = int(last_date.timestamp())
+
     prices = load_prices(args.csv_prices_file)
 
     income_dcr = 0
@@ -233,64 +532,85 @@ def main():
     fees_dcr = 0
     fees_usd = 0
 
-    with open(args.transactions_file, mode='r') as json_file:
-        tx_db = json.load(json_file)
+    votes = []
+    with open(args.transactions_file, mode='rb') as json_file:
+        # stream the transactions when ijson is available, so only the
+        # votes are kept in memory
+        if ijson != None:
+            tx_db = ijson.items(json_file, 'item', use_float=True)
+        else:
+            tx_db = json_loads(json_file.read())
+
+        for r in tx_db:
+            # most rows are not votes, so check that before handling dates
+            if r['txtype'] != 'vote' or r['vout'] != 0:
+                continue
+
+            utc_tstamp = int(r['blocktime'])
 
-    dcrctl = dcrctl_cli(no_cache=args.no_cache, cache_filename=args.cache_file)
+            if utc_tstamp < first_ts or utc_tstamp > last_ts:
+                if debug_on:
+                    logging.debug('skipping out of range date: %s', format_local_date(utc_tstamp))
+                continue
 
-    for r in tx_db:
-        utc_tstamp = int(r['blocktime'])
+            votes.append((r['txid'], utc_tstamp, format_local_date(utc_tstamp)))
 
-        tx_date = datetime.fromtimestamp(utc_tstamp, timezone.utc)
-        local_tx_date_str = tx_date.astimezone().strftime('%Y-%m-%d')
+    # talking to dcrd directly avoids starting a dcrctl process per query,
+    # so like dcrctl itself, fall back to the credentials in dcrd.conf
+    rpc_config = load_rpc_config(args.dcrctl_conf)
+    if rpc_config == None:
+        rpc_config = load_rpc_config(default_dcrd_conf, server_option='rpclisten')
+    if rpc_config == None:
+        logging.info('no dcrd RPC credentials in %s or %s, falling back to dcrctl', args.dcrctl_conf, default_dcrd_conf)
 
-        if tx_date < first_date or tx_date > last_date:
-            logging.debug('skipping out of range date: {}'.format(local_tx_date_str))
-            continue
+    dcrctl = dcrctl_cli(no_cache=args.no_cache, cache_filename=args.cache_file, rpc_config=rpc_config)
 
-        if r['txtype'] == 'vote' and r['vout'] == 0:
-            p_vday = get_days_price(prices, tx_date)
+    # fetch everything needed from dcrd up front, so the requests can be
+    # batched together instead of issued one at a time per vote
+    try:
+        vote_txs = dcrctl.get_decoded_txs([v[0] for v in votes])
 
-            logging.debug('Date: {}, Price: {:.02f}, Blocktime: {}'.format(local_tx_date_str, p_vday, utc_tstamp))
+        # ticket block number, needed to get block timestamp
+        ticket_block_times = dcrctl.get_block_times([tx['vin'][1]['blockheight'] for tx in vote_txs])
 
-            tx_contents = dcrctl.get_decoded_tx(r['txid'])
-            subsidy = tx_contents['vin'][0]['amountin']
+        # get fee details from ticket purchase
+        ticket_txs = dcrctl.get_decoded_txs([tx['vin'][1]['txid'] for tx in vote_txs])
+    finally:
+        # commit whatever was fetched, even if a later query failed
+        dcrctl.shutdown()
 
-            cur_dcr_income = subsidy
-            cur_usd_income = subsidy * p_vday
-            income_dcr += cur_dcr_income
-            income_usd += cur_usd_income
+    for v, tx_contents, ticket_block_time, ticket_tx_contents in zip(votes, vote_txs, ticket_block_times, ticket_txs):
+        txid, utc_tstamp, local_tx_date_str = v
 
-            # ticket block number, needed to get block timestamp
-            ticket_block = tx_contents['vin'][1]['blockheight']
+        p_vday = get_days_price(prices, utc_tstamp)
 
-            # get tickets block, to get timestamp
-            ticket_block_time = dcrctl.get_block_time(ticket_block)
+        logging.debug('Date: %s, Price: %.02f, Blocktime: %s', local_tx_date_str, p_vday, utc_tstamp)
 
-            # get price based on timestamp
-            ticket_date = datetime.fromtimestamp(ticket_block_time, timezone.utc)
-            local_ticket_date_str = ticket_date.astimezone().strftime('%Y-%m-%d')
+        subsidy = tx_contents['vin'][0]['amountin']
 
-            p_tday = get_days_price(prices, ticket_date)
+        cur_dcr_income = subsidy
+        cur_usd_income = subsidy * p_vday
+        income_dcr += cur_dcr_income
+        income_usd += cur_usd_income
 
-            # get fee details from ticket purchase
-            ticket_tx_contents = dcrctl.get_decoded_tx(tx_contents['vin'][1]['txid'])
+        # get price based on timestamp
+        local_ticket_date_str = format_local_date(ticket_block_time)
 
-            cur_dcr_fee = ticket_tx_contents['vin'][0]['amountin'] - ticket_tx_contents['vout'][0]['value']
-            cur_usd_fee = cur_dcr_fee * p_tday
+        p_tday = get_days_price(prices, ticket_block_time)
 
-            fees_dcr += cur_dcr_fee
-            fees_usd += cur_usd_fee
+        cur_dcr_fee = ticket_tx_contents['vin'][0]['amountin'] - ticket_tx_contents['vout'][0]['value']
+        cur_usd_fee = cur_dcr_fee * p_tday
 
-            if args.format_mode == 'compact':
-                print('Date: {}, Income: {:.02f} USD, Fee: {:.02f} USD'.format(local_tx_date_str, cur_usd_income, cur_usd_fee))
-            elif args.format_mode == 'verbose':
-                print('Vote: [Date: {}, Income: {:.04f} DCR x {:.02f} USD/DCR = {:.02f} USD] Fee: [Date: {}, {:.04f} DCR x {:.02f} USD/DCR = {:.02f} USD]'.format(local_tx_date_str, cur_dcr_income, p_vday, cur_usd_income, local_ticket_date_str, cur_dcr_fee, p_tday, cur_usd_fee))
+        fees_dcr += cur_dcr_fee
+        fees_usd += cur_usd_fee
+
+        if args.format_mode == 'compact':
+            print('Date: {}, Income: {:.02f} USD, Fee: {:.02f} USD'.format(local_tx_date_str, cur_usd_income, cur_usd_fee))
+        elif args.format_mode == 'verbose':
+            print('Vote: [Date: {}, Income: {:.04f} DCR x {:.02f} USD/DCR = {:.02f} USD] Fee: [Date: {}, {:.04f} DCR x {:.02f} USD/DCR = {:.02f} USD]'.format(local_tx_date_str, cur_dcr_income, p_vday, cur_usd_income, local_ticket_date_str, cur_dcr_fee, p_tday, cur_usd_fee))
 
     print('\nTotal Income: DCR: {:.04f}, USD: {:.02f}'.format(income_dcr, income_usd))
     print('Total Fees: DCR: {:.04f}, USD: {:.02f}'.format(fees_dcr, fees_usd))
 
-    dcrctl.shutdown()
-
 if __name__ == '__main__':
     main()